@@ -0,0 +1,14 @@
+"""Constants shared between the UI and the core app.
+
+Kept free of third-party imports so gradio_ui can load it at startup
+without pulling in the GraphRAG stack.
+"""
+
+# Example questions shown in the UI sidebar; their embeddings are
+# pre-computed at startup so clicking them skips the OpenAI round-trip
+EXAMPLE_QUESTIONS = [
+    "How is precision medicine applied to Lupus?",
+    "Can you summarize systemic lupus erythematosus (SLE)?",
+    "What are the common biomarkers for Lupus?",
+    "What treatments are available for Lupus patients?",
+]
@@ -1,13 +1,42 @@
-import gradio as gr
-from graphrag_core import GraphRAGApp
+import asyncio
+import functools
 import os
+import re
+import threading
 
+from constants import EXAMPLE_QUESTIONS
+
+_app = None
+_app_lock = threading.Lock()
+
+def _get_app():
+    """Construct the GraphRAGApp lazily on the first query.
+
+    Importing graphrag_core pulls in neo4j, openai and the rest of the
+    GraphRAG stack, so deferring it keeps UI startup fast. The lock makes
+    concurrent first queries share a single instance instead of each
+    opening its own driver and client pools.
+    """
+    global _app
+    if _app is None:
+        with _app_lock:
+            if _app is None:
+                from graphrag_core import GraphRAGApp
+                _app = GraphRAGApp()
+    return _app
+
+def _minify_css(css):
+    """Strip comments and collapse whitespace to shrink bytes sent per client"""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.DOTALL)
+    return re.sub(r'\s+', ' ', css).strip()
+
+@functools.cache
 def load_css():
-    """Load CSS from external file"""
+    """Load CSS from external file (read and minified once per process)"""
     css_file_path = os.path.join(os.path.dirname(__file__), 'styles.css')
     try:
         with open(css_file_path, 'r', encoding='utf-8') as f:
-            css_content = f.read()
+            css_content = _minify_css(f.read())
         return f"<style>\n{css_content}\n</style>"
     except FileNotFoundError:
         # Fallback CSS if file not found
@@ -21,8 +50,8 @@ def load_css():
 
 def create_gradio_interface():
     """Create and return the Gradio interface"""
-    app = GraphRAGApp()
-    
+    import gradio as gr
+
     # Load custom CSS from external file
     custom_css = load_css()
     
@@ -77,19 +106,16 @@ def create_gradio_interface():
                 )
                 
                 gr.Markdown("### 💡 Example Questions")
-                gr.Markdown("""
-                - How is precision medicine applied to Lupus?
-                - Can you summarize systemic lupus erythematosus (SLE)?
-                - What are the common biomarkers for Lupus?
-                - What treatments are available for Lupus patients?
-                """)
+                gr.Markdown("\n".join(f"- {q}" for q in EXAMPLE_QUESTIONS))
         
-        def process_query(query, top_k):
+        async def process_query(query, top_k):
             if not query.strip():
-                return "Please enter a question.", "Please enter a question."
-            
-            vector_resp, vc_resp = app.query_graphrag(query, top_k)
-            return vector_resp, vc_resp
+                yield "Please enter a question.", "Please enter a question."
+                return
+
+            app = await asyncio.to_thread(_get_app)
+            async for vector_resp, vc_resp in app.query_graphrag(query, top_k):
+                yield vector_resp, vc_resp
         
         submit_btn.click(
             fn=process_query,
@@ -104,11 +130,15 @@ def create_gradio_interface():
             outputs=[vector_output, vc_output]
         )
     
-    return interface, app
+    return interface
 
 if __name__ == "__main__":
-    interface, app = create_gradio_interface()
-    
+    interface = create_gradio_interface()
+
+    # Without the queue, concurrent users serialize on a single worker;
+    # the handlers are async I/O so they can safely overlap
+    interface.queue(default_concurrency_limit=8, max_size=64, api_open=False)
+
     try:
         interface.launch(
             server_name="127.0.0.1",
@@ -117,4 +147,6 @@ if __name__ == "__main__":
             show_error=True
         )
     finally:
-        app.close_connection() 
\ No newline at end of file
+        # Only close the connection if a query actually constructed the app
+        if _app is not None:
+            _app.close_connection() 
\ No newline at end of file